@@ -1,34 +1,289 @@
 import asyncio
+import functools
 import logging
 import os
-from typing import Dict, Any, List, Optional
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+try:
+    import uvloop
+except ImportError:  # uvloop has no Windows build; fall back to the default loop
+    uvloop = None
 from fastmcp import FastMCP
-import requests
-import json
+import httpx
+import orjson
 import base64
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(format="[%(levelname)s]: %(message)s", level=logging.INFO)
+# httpx logs every request URL (search queries included) at INFO; keep that out of the server log
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 mcp = FastMCP("GitHub PDC V1.0")
 
 # Configuration
 GITHUB_TOKEN = os.getenv("GITHUB_PERSONAL_ACCESS_TOKEN")
+# Optional comma-separated extra tokens; each has its own quotas (5000 core req/h)
+GITHUB_TOKEN_POOL = [t.strip() for t in os.getenv("GITHUB_TOKEN_POOL", "").split(",") if t.strip()]
 GITHUB_API_BASE = "https://api.github.com"
+GITHUB_GRAPHQL_URL = f"{GITHUB_API_BASE}/graphql"
 
-def get_headers():
-    """Get GitHub API headers with authentication"""
-    if not GITHUB_TOKEN:
+CREATE_COMMIT_ON_BRANCH = """
+mutation ($input: CreateCommitOnBranchInput!) {
+  createCommitOnBranch(input: $input) {
+    commit { oid }
+  }
+}
+"""
+
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.3
+MAX_RATE_LIMIT_WAIT = 60
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+ETAG_CACHE_MAXSIZE = 512
+# Fresh quota per X-RateLimit-Resource bucket, until a response reports the real
+# limit; the search buckets reset every minute, core and graphql every hour
+RATE_LIMIT_QUOTAS = {"core": 5000, "graphql": 5000, "search": 30, "code_search": 10}
+
+# LRU of url -> (etag, parsed body) for conditional GETs
+ETAG_CACHE: "OrderedDict[str, Tuple[str, Any]]" = OrderedDict()
+
+# Field extractors for the list/search responses
+BRANCH_FIELDS = itemgetter("name", "protected", "commit")
+COMMIT_FIELDS = itemgetter("sha", "commit")
+SEARCH_ITEM_FIELDS = itemgetter("path", "html_url", "repository")
+
+# (repo, branch) -> (head sha, monotonic time) for heads push_files just wrote
+REF_CACHE_TTL = 5.0
+REF_CACHE: Dict[Tuple[str, str], Tuple[str, float]] = {}
+
+# Shared HTTP/2 client: requests to api.github.com are multiplexed over one
+# keep-alive TCP+TLS connection. Created on first use inside the running event loop
+CLIENT: Optional[httpx.AsyncClient] = None
+
+def get_client() -> httpx.AsyncClient:
+    """Get the shared HTTP/2 client used by all tools"""
+    global CLIENT
+    if CLIENT is None or CLIENT.is_closed:
+        CLIENT = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            timeout=30.0
+        )
+    return CLIENT
+
+@dataclass
+class RateLimitInfo:
+    """Last known quota for one token and resource, from the X-RateLimit-* response headers"""
+    limit: int
+    remaining: int
+    reset: float = 0.0
+    cooling_until: float = 0.0
+
+TOKENS = list(dict.fromkeys(([GITHUB_TOKEN] if GITHUB_TOKEN else []) + GITHUB_TOKEN_POOL))
+# (token, X-RateLimit-Resource) -> quota; GitHub counts core, search, code_search and graphql separately
+TOKEN_LIMITS: Dict[Tuple[str, str], RateLimitInfo] = {}
+TOKEN_LOCK = threading.Lock()
+
+def rate_limit_resource(url: str) -> str:
+    """The X-RateLimit-Resource bucket a request to url is counted against"""
+    path = urlsplit(url).path
+    if path == "/graphql":
+        return "graphql"
+    if path.startswith("/search/code"):
+        return "code_search"
+    if path.startswith("/search/"):
+        return "search"
+    return "core"
+
+def rate_limit_info(token: str, resource: str) -> RateLimitInfo:
+    """Quota entry for (token, resource), created on first use; caller holds TOKEN_LOCK"""
+    info = TOKEN_LIMITS.get((token, resource))
+    if info is None:
+        quota = RATE_LIMIT_QUOTAS.get(resource, RATE_LIMIT_QUOTAS["core"])
+        info = TOKEN_LIMITS[(token, resource)] = RateLimitInfo(limit=quota, remaining=quota)
+    return info
+
+def available_quota(info: RateLimitInfo, now: float) -> int:
+    """Requests a token can still make right now (0 while benched or exhausted)"""
+    if info.cooling_until > now:
+        return 0
+    if info.reset <= now:
+        return info.limit
+    return info.remaining
+
+def pick_token(resource: str = "core") -> str:
+    """Pick the pooled token with the most remaining quota in the given resource bucket"""
+    if not TOKENS:
         raise ValueError("GITHUB_PERSONAL_ACCESS_TOKEN required")
     
+    now = time.time()
+    with TOKEN_LOCK:
+        limits = {token: rate_limit_info(token, resource) for token in TOKENS}
+        best = max(TOKENS, key=lambda token: available_quota(limits[token], now))
+        if available_quota(limits[best], now) > 0:
+            return best
+        # Every token is out: use the one that recovers first
+        return min(TOKENS, key=lambda token: max(limits[token].cooling_until, limits[token].reset))
+
+def has_available_token(resource: str = "core") -> bool:
+    """Whether any pooled token can make a request in the given resource bucket right now"""
+    now = time.time()
+    with TOKEN_LOCK:
+        return any(available_quota(rate_limit_info(token, resource), now) > 0 for token in TOKENS)
+
+def record_rate_limit(token: str, resource: str, response: httpx.Response, cooldown: Optional[float] = None) -> None:
+    """Update a token's quota for one resource from the response headers, optionally benching it for cooldown seconds"""
+    # GitHub names the bucket it counted the request against; trust it over the URL-based guess
+    resource = response.headers.get("X-RateLimit-Resource", resource)
+    limit = response.headers.get("X-RateLimit-Limit")
+    remaining = response.headers.get("X-RateLimit-Remaining")
+    reset = response.headers.get("X-RateLimit-Reset")
+    
+    with TOKEN_LOCK:
+        info = rate_limit_info(token, resource)
+        if limit is not None:
+            info.limit = int(limit)
+        if remaining is not None:
+            info.remaining = int(remaining)
+        if reset is not None:
+            info.reset = float(reset)
+        if cooldown is not None:
+            info.cooling_until = time.time() + cooldown
+
+@functools.lru_cache(maxsize=None)
+def get_headers(token: str):
+    """Get GitHub API headers with authentication"""
     return {
-        "Authorization": f"Bearer {GITHUB_TOKEN}",
+        "Authorization": f"Bearer {token}",
         "Accept": "application/vnd.github+json",
+        "Accept-Encoding": "gzip, br",
+        "Content-Type": "application/json",
         "X-GitHub-Api-Version": "2022-11-28"
     }
 
+def is_rate_limited(response: httpx.Response) -> bool:
+    """Primary (quota exhausted) or secondary (abuse) rate limit response"""
+    if response.status_code == 429:
+        return True
+    return response.status_code == 403 and (
+        response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers
+    )
+
+def retry_delay(method: str, response: httpx.Response, attempt: int) -> Optional[float]:
+    """
+    Seconds to wait before retrying, or None if the response is final
+    
+    Rate limit waits are returned uncapped: they are how long the token is out,
+    and github_request decides whether that is worth waiting for.
+    """
+    backoff = RETRY_BACKOFF * (2 ** attempt)
+    
+    if is_rate_limited(response):
+        if "Retry-After" in response.headers:
+            return float(response.headers["Retry-After"])
+        if "X-RateLimit-Reset" in response.headers:
+            wait = float(response.headers["X-RateLimit-Reset"]) - time.time()
+            return max(wait, backoff)
+        return backoff
+    
+    # Server errors are only retried when repeating the request is safe
+    if response.status_code in (502, 503, 504) and method in IDEMPOTENT_METHODS:
+        return backoff
+    
+    return None
+
+async def github_request(
+    method: str,
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    **kwargs
+) -> httpx.Response:
+    """Send a GitHub API request with rate-limit aware retries across the token pool"""
+    resource = rate_limit_resource(url)
+    for attempt in range(MAX_RETRIES + 1):
+        token = pick_token(resource)
+        request_headers = {**get_headers(token), **headers} if headers else get_headers(token)
+        response = await get_client().request(method, url, headers=request_headers, **kwargs)
+        
+        delay = retry_delay(method, response, attempt)
+        rate_limited = is_rate_limited(response)
+        record_rate_limit(token, resource, response, cooldown=delay if rate_limited else None)
+        
+        if delay is None or attempt == MAX_RETRIES:
+            return response
+        
+        # A rate-limited token is benched; retry straight away if another one is free,
+        # and give up rather than sleep if every token is out for longer than the cap
+        if rate_limited:
+            if has_available_token(resource):
+                delay = 0
+            elif delay > MAX_RATE_LIMIT_WAIT:
+                return response
+        
+        logger.warning(f"GitHub API {response.status_code} on {method} {url}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+def http_error(response: httpx.Response) -> Dict[str, Any]:
+    """Tool error result for a failed GitHub API response"""
+    error = f"HTTP {response.status_code}: {response.text[:200]}"
+    logger.error(f"GitHub API {response.request.method} {response.request.url} failed: {error}")
+    return {
+        "success": False,
+        "error": error
+    }
+
+async def cached_get(url: str, params: Optional[Dict[str, Any]] = None) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """
+    GET a JSON resource, revalidating with If-None-Match
+    
+    A 304 Not Modified has no body and does not count against the rate
+    limit, so unchanged data is served from ETAG_CACHE.
+    
+    Returns (data, None) on success or (None, error result) on an HTTP error.
+    """
+    key = f"{url}?{urlencode(sorted(params.items()))}" if params else url
+    cached = ETAG_CACHE.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else None
+    
+    response = await github_request("GET", url, headers=headers, params=params)
+    
+    if response.status_code == 304 and cached:
+        ETAG_CACHE.move_to_end(key)
+        return cached[1], None
+    
+    if response.status_code >= 400:
+        return None, http_error(response)
+    
+    data = orjson.loads(response.content)
+    
+    etag = response.headers.get("ETag")
+    if etag:
+        ETAG_CACHE[key] = (etag, data)
+        ETAG_CACHE.move_to_end(key)
+        if len(ETAG_CACHE) > ETAG_CACHE_MAXSIZE:
+            ETAG_CACHE.popitem(last=False)
+    
+    return data, None
+
+async def get_branch_head(repo: str, branch: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Get the branch head SHA, reusing one we just pushed ourselves if it is still fresh"""
+    cached = REF_CACHE.get((repo, branch))
+    if cached and time.monotonic() - cached[1] < REF_CACHE_TTL:
+        return cached[0], None
+    
+    ref_url = f"{GITHUB_API_BASE}/repos/{repo}/git/ref/heads/{branch}"
+    ref, error = await cached_get(ref_url)
+    if error:
+        return None, error
+    return ref["object"]["sha"], None
+
 @mcp.tool()
-def create_pull_request(
+async def create_pull_request(
     repo: str,
     title: str,
     head: str,
@@ -63,10 +318,11 @@ def create_pull_request(
         if body:
             data["body"] = body
         
-        response = requests.post(url, headers=get_headers(), json=data)
-        response.raise_for_status()
+        response = await github_request("POST", url, content=orjson.dumps(data))
+        if response.status_code >= 400:
+            return http_error(response)
         
-        pr = response.json()
+        pr = orjson.loads(response.content)
         
         return {
             "success": True,
@@ -85,7 +341,7 @@ def create_pull_request(
         }
 
 @mcp.tool()
-def create_branch(
+async def create_branch(
     repo: str,
     branch_name: str,
     from_branch: str = "main"
@@ -104,10 +360,11 @@ def create_branch(
     try:
         # Get the SHA of the source branch
         ref_url = f"{GITHUB_API_BASE}/repos/{repo}/git/ref/heads/{from_branch}"
-        ref_response = requests.get(ref_url, headers=get_headers())
-        ref_response.raise_for_status()
+        ref, error = await cached_get(ref_url)
+        if error:
+            return error
         
-        source_sha = ref_response.json()["object"]["sha"]
+        source_sha = ref["object"]["sha"]
         
         # Create new branch
         create_url = f"{GITHUB_API_BASE}/repos/{repo}/git/refs"
@@ -116,8 +373,9 @@ def create_branch(
             "sha": source_sha
         }
         
-        response = requests.post(create_url, headers=get_headers(), json=data)
-        response.raise_for_status()
+        response = await github_request("POST", create_url, content=orjson.dumps(data))
+        if response.status_code >= 400:
+            return http_error(response)
         
         return {
             "success": True,
@@ -135,7 +393,7 @@ def create_branch(
         }
 
 @mcp.tool()
-def list_branches(
+async def list_branches(
     repo: str,
     limit: int = 30
 ) -> Dict[str, Any]:
@@ -153,18 +411,17 @@ def list_branches(
         url = f"{GITHUB_API_BASE}/repos/{repo}/branches"
         params = {"per_page": min(limit, 100)}
         
-        response = requests.get(url, headers=get_headers(), params=params)
-        response.raise_for_status()
-        
-        branches = response.json()
+        branches, error = await cached_get(url, params=params)
+        if error:
+            return error
         
         branch_list = [
             {
-                "name": b["name"],
-                "protected": b["protected"],
-                "commit_sha": b["commit"]["sha"]
+                "name": name,
+                "protected": protected,
+                "commit_sha": commit["sha"]
             }
-            for b in branches
+            for name, protected, commit in map(BRANCH_FIELDS, branches)
         ]
         
         return {
@@ -181,7 +438,7 @@ def list_branches(
         }
 
 @mcp.tool()
-def create_issue(
+async def create_issue(
     repo: str,
     title: str,
     body: Optional[str] = None,
@@ -213,10 +470,11 @@ def create_issue(
         if assignees:
             data["assignees"] = assignees
         
-        response = requests.post(url, headers=get_headers(), json=data)
-        response.raise_for_status()
+        response = await github_request("POST", url, content=orjson.dumps(data))
+        if response.status_code >= 400:
+            return http_error(response)
         
-        issue = response.json()
+        issue = orjson.loads(response.content)
         
         return {
             "success": True,
@@ -234,7 +492,7 @@ def create_issue(
         }
 
 @mcp.tool()
-def list_commits(
+async def list_commits(
     repo: str,
     branch: str = "main",
     limit: int = 30
@@ -257,19 +515,18 @@ def list_commits(
             "per_page": min(limit, 100)
         }
         
-        response = requests.get(url, headers=get_headers(), params=params)
-        response.raise_for_status()
-        
-        commits = response.json()
+        commits, error = await cached_get(url, params=params)
+        if error:
+            return error
         
         commit_list = [
             {
-                "sha": c["sha"][:7],
-                "message": c["commit"]["message"].split('\n')[0],
-                "author": c["commit"]["author"]["name"],
-                "date": c["commit"]["author"]["date"]
+                "sha": sha[:7],
+                "message": commit["message"].partition('\n')[0],
+                "author": commit["author"]["name"],
+                "date": commit["author"]["date"]
             }
-            for c in commits
+            for sha, commit in map(COMMIT_FIELDS, commits)
         ]
         
         return {
@@ -287,7 +544,7 @@ def list_commits(
         }
 
 @mcp.tool()
-def search_code(
+async def search_code(
     repo: str,
     query: str,
     limit: int = 10
@@ -313,18 +570,17 @@ def search_code(
             "per_page": min(limit, 30)
         }
         
-        response = requests.get(url, headers=get_headers(), params=params)
-        response.raise_for_status()
-        
-        data = response.json()
+        data, error = await cached_get(url, params=params)
+        if error:
+            return error
         
         results = [
             {
-                "path": item["path"],
-                "url": item["html_url"],
-                "repository": item["repository"]["full_name"]
+                "path": path,
+                "url": html_url,
+                "repository": repository["full_name"]
             }
-            for item in data.get("items", [])
+            for path, html_url, repository in map(SEARCH_ITEM_FIELDS, data.get("items", []))
         ]
         
         return {
@@ -342,7 +598,7 @@ def search_code(
         }
 
 @mcp.tool()
-def push_files(
+async def push_files(
     repo: str,
     branch: str,
     files: List[Dict[str, str]],
@@ -374,72 +630,65 @@ def push_files(
     """
     try:
         # Get reference for the branch
-        ref_url = f"{GITHUB_API_BASE}/repos/{repo}/git/ref/heads/{branch}"
-        ref_response = requests.get(ref_url, headers=get_headers())
-        ref_response.raise_for_status()
-        
-        base_sha = ref_response.json()["object"]["sha"]
-        
-        # Get base tree
-        commit_url = f"{GITHUB_API_BASE}/repos/{repo}/git/commits/{base_sha}"
-        commit_response = requests.get(commit_url, headers=get_headers())
-        commit_response.raise_for_status()
-        
-        base_tree_sha = commit_response.json()["tree"]["sha"]
-        
-        # Create blobs for each file
-        tree_items = []
-        for file_info in files:
-            # Create blob
-            blob_url = f"{GITHUB_API_BASE}/repos/{repo}/git/blobs"
-            blob_data = {
-                "content": file_info["content"],
-                "encoding": "utf-8"
-            }
-            
-            blob_response = requests.post(blob_url, headers=get_headers(), json=blob_data)
-            blob_response.raise_for_status()
-            
-            blob_sha = blob_response.json()["sha"]
-            
-            tree_items.append({
-                "path": file_info["path"],
-                "mode": "100644",
-                "type": "blob",
-                "sha": blob_sha
-            })
-        
-        # Create tree
-        tree_url = f"{GITHUB_API_BASE}/repos/{repo}/git/trees"
-        tree_data = {
-            "base_tree": base_tree_sha,
-            "tree": tree_items
-        }
+        base_sha, error = await get_branch_head(repo, branch)
+        if error:
+            return error
         
-        tree_response = requests.post(tree_url, headers=get_headers(), json=tree_data)
-        tree_response.raise_for_status()
+        # Single GraphQL mutation replaces the blob/tree/commit/ref REST sequence
+        additions = [
+            {
+                "path": file_info["path"],
+                "contents": base64.b64encode(file_info["content"].encode("utf-8")).decode("ascii")
+            }
+            for file_info in files
+        ]
         
-        new_tree_sha = tree_response.json()["sha"]
+        headline, _, message_body = commit_message.partition("\n")
+        message = {"headline": headline}
+        if message_body.strip():
+            message["body"] = message_body.strip()
+        
+        async def commit_on(head_sha: str) -> httpx.Response:
+            mutation_data = {
+                "query": CREATE_COMMIT_ON_BRANCH,
+                "variables": {
+                    "input": {
+                        "branch": {
+                            "repositoryNameWithOwner": repo,
+                            "branchName": branch
+                        },
+                        "message": message,
+                        "fileChanges": {"additions": additions},
+                        "expectedHeadOid": head_sha
+                    }
+                }
+            }
+            
+            return await github_request("POST", GITHUB_GRAPHQL_URL, content=orjson.dumps(mutation_data))
         
-        # Create commit
-        commit_create_url = f"{GITHUB_API_BASE}/repos/{repo}/git/commits"
-        commit_data = {
-            "message": commit_message,
-            "tree": new_tree_sha,
-            "parents": [base_sha]
-        }
+        mutation_response = await commit_on(base_sha)
+        if mutation_response.status_code >= 400:
+            return http_error(mutation_response)
         
-        commit_create_response = requests.post(commit_create_url, headers=get_headers(), json=commit_data)
-        commit_create_response.raise_for_status()
+        result = orjson.loads(mutation_response.content)
         
-        new_commit_sha = commit_create_response.json()["sha"]
+        # A cached head is stale if someone else pushed in the meantime: retry once on the live ref
+        if result.get("errors") and REF_CACHE.pop((repo, branch), None):
+            base_sha, error = await get_branch_head(repo, branch)
+            if error:
+                return error
+            
+            mutation_response = await commit_on(base_sha)
+            if mutation_response.status_code >= 400:
+                return http_error(mutation_response)
+            
+            result = orjson.loads(mutation_response.content)
         
-        # Update reference
-        ref_update_url = f"{GITHUB_API_BASE}/repos/{repo}/git/refs/heads/{branch}"
-        ref_data = {"sha": new_commit_sha}
+        if result.get("errors"):
+            raise RuntimeError("; ".join(err["message"] for err in result["errors"]))
         
-        ref_update_response = requests.patch(ref_update_url, headers=get_headers(), json=ref_data)
-        ref_update_response.raise_for_status()
+        new_commit_sha = result["data"]["createCommitOnBranch"]["commit"]["oid"]
+        REF_CACHE[(repo, branch)] = (new_commit_sha, time.monotonic())
         
         return {
             "success": True,
@@ -457,7 +706,7 @@ def push_files(
         }
 
 @mcp.tool()
-def connection_status() -> Dict[str, Any]:
+async def connection_status() -> Dict[str, Any]:
     """
     Check GitHub API connection status
     
@@ -465,16 +714,16 @@ def connection_status() -> Dict[str, Any]:
     """
     try:
         url = f"{GITHUB_API_BASE}/user"
-        response = requests.get(url, headers=get_headers())
-        response.raise_for_status()
-        
-        user = response.json()
+        user, error = await cached_get(url)
+        if error:
+            return {**error, "connected": False, "version": "V1.0"}
         
         return {
             "success": True,
             "connected": True,
             "user": user["login"],
             "name": user.get("name"),
+            "token_pool_size": len(TOKENS),
             "version": "V1.0",
             "capabilities": [
                 "Pull Requests: create",
@@ -510,5 +759,6 @@ if __name__ == "__main__":
             transport="streamable-http",
             host="0.0.0.0",
             port=port,
-        )
+        ),
+        loop_factory=uvloop.new_event_loop if uvloop else None,
     )
@@ -1,17 +1,32 @@
 import asyncio
 import logging
 import os
+import queue
+import re
 import base64
-from typing import Dict, Any, List
-from fastmcp import FastMCP
+import functools
+import time
+from datetime import datetime, timezone
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, List, Optional, Tuple
+try:
+    import uvloop
+except ImportError:  # uvloop has no Windows build; fall back to the default loop
+    uvloop = None
+from fastmcp import Context, FastMCP
+import pyarrow as pa
+import pyarrow.compute as pc
 import snowflake.connector
+from snowflake.connector.errors import InterfaceError, NotSupportedError, OperationalError
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(format="[%(levelname)s]: %(message)s", level=logging.INFO)
 
-mcp = FastMCP("Snowflake PDC V2.2")
+VERSION = "V2.2"
 
 # Configuration
 SNOWFLAKE_ACCOUNT = os.getenv("SNOWFLAKE_ACCOUNT", "RRNMGCG-PRODUCTDATACLOUD")
@@ -22,135 +37,683 @@ SNOWFLAKE_SCHEMA = os.getenv("SNOWFLAKE_SCHEMA", "PDC_PRODUCTS")
 SNOWFLAKE_WAREHOUSE = os.getenv("SNOWFLAKE_WAREHOUSE", "COMPUTE_WH")
 SNOWFLAKE_ROLE = os.getenv("SNOWFLAKE_ROLE", "ACCOUNTADMIN")
 SNOWFLAKE_PRIVATE_KEY_CONTENT = os.getenv("SNOWFLAKE_PRIVATE_KEY_CONTENT")
+SNOWFLAKE_NETWORK_TIMEOUT = int(os.getenv("SNOWFLAKE_NETWORK_TIMEOUT", 300))
+SNOWFLAKE_POOL_MAX = int(os.getenv("SNOWFLAKE_POOL_MAX", 8))
+SNOWFLAKE_POOL_LIFETIME_S = int(os.getenv("SNOWFLAKE_POOL_LIFETIME_S", 3600))
+SNOWFLAKE_PREWARM_COUNT = int(os.getenv("SNOWFLAKE_PREWARM_COUNT", 1))
+RESULT_CACHE_TTL = float(os.getenv("SNOWFLAKE_RESULT_CACHE_TTL", 60))
 
 DEFAULT_MAX_ROWS = 20
 MAX_ROWS_LIMIT = 1000
+_MAX_ROWS_ERROR = f"max_rows must be between 1 and {MAX_ROWS_LIMIT}"
+CONNECTION_IDLE_CHECK_SECONDS = 300
+# Async query status polling backs off from MIN to MAX seconds
+QUERY_POLL_MIN_SECONDS = 0.05
+QUERY_POLL_MAX_SECONDS = 0.5
+RESULT_CACHE_MAXSIZE = 256
+# connection_status reuses its last successful probe for this many seconds
+STATUS_CACHE_TTL = 30.0
+# Rows per executemany call, so one huge batch doesn't become one huge bind
+BATCH_INSERT_CHUNK_ROWS = 16384
+# Upper bound on rows per batch_insert call; bigger loads belong in COPY INTO
+BATCH_INSERT_MAX_ROWS = 100_000
 
-def get_snowflake_connection():
-    """Get Snowflake connection with JWT auth"""
-    if not SNOWFLAKE_PRIVATE_KEY_CONTENT:
-        raise ValueError("SNOWFLAKE_PRIVATE_KEY_CONTENT required")
-    
+# Columns whose name contains one of these get long string values truncated
+LARGE_PATTERNS = frozenset(("JSON", "DATA", "RESPONSE", "CONTENT", "DESCRIPTION"))
+TRUNCATE_CHARS = 500
+
+# V2.2: Added MERGE and transaction support
+ALLOWED_STARTS = ('SELECT', 'SHOW', 'DESCRIBE', 'CREATE', 'ALTER', 'INSERT', 'UPDATE', 'DELETE', 'MERGE', 'BEGIN', 'COMMIT', 'ROLLBACK')
+
+# Case-insensitive regexes scan the original string instead of an upper-cased copy
+_ALLOWED_RE = re.compile(rf"^\s*({'|'.join(ALLOWED_STARTS)})\b", re.IGNORECASE)
+_ALLOWED_ERROR = f"Only {', '.join(ALLOWED_STARTS)} allowed"
+READ_OPERATIONS = ('SELECT', 'SHOW', 'DESCRIBE')
+_TRANSACTION_ERROR = "BEGIN/COMMIT/ROLLBACK must be sent in one call with the statements they wrap, e.g. 'BEGIN; UPDATE ...; COMMIT'"
+_SESSION_STATE_ERROR = "ALTER SESSION and temporary tables only last for one call; send them with the statements that use them, e.g. 'ALTER SESSION SET ...; SELECT ...'"
+# classify: one scan finds every keyword that matters; word boundaries keep identifiers
+# like RATE_LIMIT from matching. Groups: 1 = DROP/TRUNCATE, 2 = WHERE, 3 = LIMIT, 4 = COUNT(, 5 = GROUP BY
+_SHAPE_RE = re.compile(r"\b(?:(DROP|TRUNCATE)\b|(WHERE)\b|(LIMIT)\b|(COUNT)\s*\(|(GROUP)\s+BY\b)", re.IGNORECASE)
+
+# Quoted literals (with Snowflake's backslash escapes), quoted identifiers and $$ strings.
+# normalize_sql keeps them verbatim while folding case/whitespace elsewhere
+_QUOTED_RE = re.compile(r"""('(?:[^'\\]|\\.|'')*'|"(?:[^"]|"")*"|\$\$.*?\$\$)""", re.DOTALL)
+# The same plus --, // and /* */ comments (uncaptured), in the order Snowflake's lexer sees them
+_LEXEME_RE = re.compile(rf"{_QUOTED_RE.pattern}|--[^\n]*|//[^\n]*|/\*.*?\*/", re.DOTALL)
+# Session-scoped state that must not follow a pooled connection to the next caller
+_SESSION_STATE_RE = re.compile(
+    r"^\s*(?:ALTER\s+SESSION|CREATE\s+(?:OR\s+REPLACE\s+)?(?:(?:LOCAL|GLOBAL)\s+)?(?:TEMP|TEMPORARY|VOLATILE))\b",
+    re.IGNORECASE,
+)
+# Left outside any lexeme, these mean a literal or comment was never closed
+_UNTERMINATED = ("'", '"', "$$", "/*")
+_WHITESPACE_RE = re.compile(r"\s+")
+# Reads calling these differ from run to run, so they bypass the result cache
+_NONDETERMINISTIC_RE = re.compile(
+    r"\b(?:CURRENT_TIMESTAMP|CURRENT_DATE|CURRENT_TIME|LOCALTIMESTAMP|LOCALTIME|SYSDATE|SYSTIMESTAMP|GETDATE"
+    r"|RANDOM|RANDSTR|UNIFORM|UUID_STRING|SEQ[1248])\b",
+    re.IGNORECASE,
+)
+
+# batch_insert: table/column names can't be bound, so only plain or double-quoted identifiers are accepted
+_IDENTIFIER = r'(?:[A-Za-z_][A-Za-z0-9_$]*|"(?:[^"]|"")+")'
+_COLUMN_RE = re.compile(rf"^{_IDENTIFIER}$")
+_TABLE_RE = re.compile(rf"^{_IDENTIFIER}(?:\.{_IDENTIFIER}){{0,2}}$")
+
+# LRU of (normalized sql, max_rows, compact) -> (monotonic insert time, read result)
+_RESULT_CACHE: "OrderedDict[Tuple[str, int, bool], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+# Reads in flight; identical concurrent reads wait on the first one instead of re-running it
+_PENDING_READS: Dict[Tuple[str, int, bool], asyncio.Event] = {}
+# Bumped by every write so reads that started before it are not cached
+_CACHE_GENERATION = 0
+# (monotonic time, response) of the last successful connection_status probe
+_STATUS_CACHE: Optional[Tuple[float, Dict[str, Any]]] = None
+
+# Fixed part of the connection_status response, built once
+STATIC_STATUS = {
+    "auth_method": "JWT",
+    "version": VERSION,
+    "capabilities": [
+        "READ: SELECT/SHOW/DESCRIBE",
+        "WRITE: INSERT/UPDATE/DELETE (with WHERE)",
+        "UPSERT: MERGE (NEW!)",
+        "TRANSACTIONS: BEGIN/COMMIT/ROLLBACK (NEW!)",
+        "DDL: CREATE/ALTER",
+        "BLOCKED: DROP/TRUNCATE"
+    ],
+    "limits": {"max_rows": f"1-{MAX_ROWS_LIMIT}", "default_rows": DEFAULT_MAX_ROWS},
+    "optimizations": ["Auto-LIMIT", "Token-optimized", "Column truncation", "Dynamic limits (NEW!)"]
+}
+
+def load_private_key():
+    """Decode and parse the base64-encoded PEM private key"""
     key_bytes = base64.b64decode(SNOWFLAKE_PRIVATE_KEY_CONTENT)
-    private_key = serialization.load_pem_private_key(
+    return serialization.load_pem_private_key(
         key_bytes, 
         password=None, 
         backend=default_backend()
     )
+
+# Parsed once at import: RSA key deserialization is pure CPU and never changes
+_PRIVATE_KEY = load_private_key() if SNOWFLAKE_PRIVATE_KEY_CONTENT else None
+
+# Idle warm connections as (conn, created_at, last_used); LIFO so the most
+# recently used (least likely to be stale) connection is handed out first
+_POOL: "queue.LifoQueue" = queue.LifoQueue(maxsize=SNOWFLAKE_POOL_MAX)
+# One slot per open connection, idle or checked out
+_POOL_SLOTS = asyncio.Semaphore(SNOWFLAKE_POOL_MAX)
+
+def _build_connection():
+    """Open a new Snowflake connection with JWT auth"""
+    if _PRIVATE_KEY is None:
+        raise ValueError("SNOWFLAKE_PRIVATE_KEY_CONTENT required")
     
     return snowflake.connector.connect(
         account=SNOWFLAKE_ACCOUNT,
         user=SNOWFLAKE_USER,
-        private_key=private_key,
+        private_key=_PRIVATE_KEY,
         database=SNOWFLAKE_DATABASE,
         schema=SNOWFLAKE_SCHEMA,
         warehouse=SNOWFLAKE_WAREHOUSE,
-        role=SNOWFLAKE_ROLE
+        role=SNOWFLAKE_ROLE,
+        # Heartbeats keep the long-lived session from expiring while idle
+        client_session_keep_alive=True,
+        network_timeout=SNOWFLAKE_NETWORK_TIMEOUT,
+        # Don't block connecting on an unreachable OCSP responder
+        ocsp_fail_open=True,
+        # Server-side binding, so batch_insert's executemany becomes an array bind
+        paramstyle="qmark"
     )
 
-def enforce_limit(sql: str, max_rows: int) -> str:
-    """Automatically add LIMIT if missing"""
-    sql_upper = sql.strip().upper()
-    if 'LIMIT' in sql_upper:
+def _is_alive(conn) -> bool:
+    """Cheap liveness probe for a connection that has been sitting idle"""
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+        return True
+    except snowflake.connector.errors.Error:
+        return False
+
+def _checkout():
+    """Take a usable idle connection from the pool, or open a new one"""
+    while True:
+        try:
+            conn, created_at, last_used = _POOL.get_nowait()
+        except queue.Empty:
+            return _build_connection(), time.monotonic()
+        
+        now = time.monotonic()
+        if conn.is_closed() or now - created_at > SNOWFLAKE_POOL_LIFETIME_S:
+            conn.close()
+            continue
+        if now - last_used > CONNECTION_IDLE_CHECK_SECONDS and not _is_alive(conn):
+            logger.warning("Snowflake connection went stale, reconnecting")
+            conn.close()
+            continue
+        return conn, created_at
+
+def _checkin(conn, created_at, broken: bool, discard: bool = False):
+    """Return a checked-out connection to the pool, or close it if broken, discarded or expired"""
+    if discard and not broken:
+        # Never leave an open transaction to be cleaned up by session teardown
+        try:
+            conn.rollback()
+        except snowflake.connector.errors.Error:
+            pass
+    if broken or discard or conn.is_closed() or time.monotonic() - created_at > SNOWFLAKE_POOL_LIFETIME_S:
+        conn.close()
+    else:
+        _POOL.put_nowait((conn, created_at, time.monotonic()))
+
+def _close_abandoned(checkout: "asyncio.Future") -> None:
+    """Done-callback for a checkout whose caller was cancelled: close the connection it produced"""
+    if checkout.cancelled() or checkout.exception() is not None:
+        return
+    conn, _ = checkout.result()
+    asyncio.get_running_loop().run_in_executor(None, conn.close)
+
+@asynccontextmanager
+async def acquire(discard: bool = False):
+    """
+    Check out a pooled Snowflake connection (at most SNOWFLAKE_POOL_MAX open at once)
+    
+    discard closes the connection afterwards instead of pooling it, for callers
+    that change session state (transactions, ALTER SESSION, temporary tables).
+    """
+    # Wait for a slot on the event loop rather than parking a worker thread,
+    # which the slot holders need for their own blocking connector calls
+    try:
+        await asyncio.wait_for(_POOL_SLOTS.acquire(), SNOWFLAKE_NETWORK_TIMEOUT)
+    except TimeoutError:
+        raise TimeoutError(f"No Snowflake connection available (pool max {SNOWFLAKE_POOL_MAX})")
+    try:
+        # Cancelling the await doesn't stop the worker thread; shield the checkout so a
+        # connection it opens afterwards is closed instead of heartbeating forever unowned
+        checkout = asyncio.ensure_future(asyncio.to_thread(_checkout))
+        try:
+            conn, created_at = await asyncio.shield(checkout)
+        except asyncio.CancelledError:
+            checkout.add_done_callback(_close_abandoned)
+            raise
+        broken = False
+        try:
+            yield conn
+        except (OperationalError, InterfaceError):
+            # Network/session failures can leave the connection unusable; SQL errors
+            # (ProgrammingError) don't, so only these keep it out of the pool
+            broken = True
+            raise
+        finally:
+            # close() talks to Snowflake, so a dead connection must not stall the loop
+            await asyncio.to_thread(_checkin, conn, created_at, broken, discard)
+    finally:
+        _POOL_SLOTS.release()
+
+async def _prewarm_pool(count: int):
+    """Open up to count connections and leave them idle in the pool"""
+    # Hold every checkout at once so each opens its own connection instead of reusing the last
+    async with AsyncExitStack() as stack:
+        results = await asyncio.gather(
+            *(stack.enter_async_context(acquire()) for _ in range(min(count, SNOWFLAKE_POOL_MAX))),
+            return_exceptions=True,
+        )
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        logger.warning("Pool pre-warm failed: %s", errors[0])
+    else:
+        logger.info("Pool pre-warmed with %d connection(s)", len(results))
+
+@asynccontextmanager
+async def lifespan(server):
+    """Pre-warm the pool in the background so the first request skips Snowflake auth"""
+    prewarm = asyncio.create_task(_prewarm_pool(SNOWFLAKE_PREWARM_COUNT)) if SNOWFLAKE_PREWARM_COUNT > 0 else None
+    try:
+        yield
+    finally:
+        if prewarm and not prewarm.done():
+            prewarm.cancel()
+
+mcp = FastMCP(f"Snowflake PDC {VERSION}", lifespan=lifespan)
+
+async def execute_polling(conn, cursor, sql: str):
+    """Submit sql asynchronously and await completion without holding a thread"""
+    # Each connector call is a blocking REST round-trip; keep them off the event loop
+    await asyncio.to_thread(cursor.execute_async, sql)
+    query_id = cursor.sfqid
+    delay = QUERY_POLL_MIN_SECONDS
+    while conn.is_still_running(await asyncio.to_thread(conn.get_query_status_throw_if_error, query_id)):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, QUERY_POLL_MAX_SECONDS)
+    # Polling already saw the query finish: fetch its result directly (one GET, description
+    # filled in at once) rather than get_results_from_sfqid's extra status check and RESULT_SCAN
+    await asyncio.to_thread(cursor.query_result, query_id)
+
+def split_statements(sql: str) -> List[str]:
+    """
+    Split on semicolons outside literals, identifiers, $$ strings and comments
+    
+    Comments are removed and empty statements dropped, so the statements that
+    are validated are exactly the text sent to Snowflake. Raises ValueError for
+    an unterminated literal or comment rather than guess where it ends.
+    """
+    statements, current = [], []
+    for i, part in enumerate(_LEXEME_RE.split(sql)):
+        if i % 2:
+            # None is a comment; a space keeps the tokens either side of it apart
+            current.append(' ' if part is None else part)
+            continue
+        if any(token in part for token in _UNTERMINATED):
+            raise ValueError("Unterminated quoted string, $$ string or comment")
+        head, *rest = part.split(';')
+        current.append(head)
+        for piece in rest:
+            statements.append(''.join(current).strip())
+            current = [piece]
+    statements.append(''.join(current).strip())
+    return [statement for statement in statements if statement]
+
+@dataclass(frozen=True)
+class SqlShape:
+    """What the safety checks and enforce_limit need to know about one statement"""
+    operation: Optional[str]
+    dangerous: bool
+    has_where: bool
+    has_limit: bool
+    has_count: bool
+    has_group_by: bool
+    changes_session: bool
+
+def classify(sql: str) -> SqlShape:
+    """Scan a stripped statement once and record its leading keyword and clauses"""
+    # Dispatch on the matched leading keyword only; never upper-case the whole statement
+    statement = _ALLOWED_RE.match(sql)
+    operation = statement.group(1).upper() if statement else None
+    found = {match.lastindex for match in _SHAPE_RE.finditer(sql)}
+    # DROP/TRUNCATE is refused anywhere, even inside quotes or comments; the other clauses
+    # only count outside them, so WHERE msg = 'rate limit hit' has no LIMIT clause
+    dangerous = 1 in found
+    if any(token in sql for token in ("'", '"', "$$", "--", "/")):
+        masked = _LEXEME_RE.sub(lambda match: "''" if match.group(1) else " ", sql)
+        found = {match.lastindex for match in _SHAPE_RE.finditer(masked)}
+    return SqlShape(
+        operation=operation,
+        dangerous=dangerous,
+        has_where=2 in found,
+        has_limit=3 in found,
+        has_count=4 in found,
+        has_group_by=5 in found,
+        changes_session=operation == 'BEGIN' or (operation in ('ALTER', 'CREATE') and bool(_SESSION_STATE_RE.match(sql))),
+    )
+
+def check_statement(shape: SqlShape) -> Optional[str]:
+    """Apply the safety rules to a classified statement; returns an error message or None"""
+    if shape.operation is None:
+        return _ALLOWED_ERROR
+    if shape.dangerous:
+        return "DROP/TRUNCATE not allowed for safety"
+    if shape.operation in ('UPDATE', 'DELETE') and not shape.has_where:
+        return "UPDATE/DELETE requires WHERE clause"
+    return None
+
+def enforce_limit(sql: str, shape: SqlShape, max_rows: int) -> str:
+    """Automatically add LIMIT if missing (sql must already be stripped)"""
+    if shape.operation != 'SELECT' or shape.has_limit:
         return sql
-    if sql_upper.startswith('SELECT'):
-        if 'COUNT(' in sql_upper and 'GROUP BY' not in sql_upper:
-            return sql
-        return f"{sql.strip()} LIMIT {max_rows}"
-    return sql
-
-def optimize_columns(data: List[Dict], columns: List[str]) -> List[Dict]:
-    """Reduce token usage by filtering large columns"""
-    if not data or len(data) == 0:
-        return data
-    
-    large_patterns = ['JSON', 'DATA', 'RESPONSE', 'CONTENT', 'DESCRIPTION']
-    optimized_data = []
-    for row in data:
-        optimized_row = {}
-        for col in columns:
-            value = row.get(col)
-            is_large = any(pattern in col.upper() for pattern in large_patterns)
-            if is_large and isinstance(value, str) and len(value) > 500:
-                optimized_row[col] = value[:500] + f"... [truncated {len(value)-500} chars]"
-            else:
-                optimized_row[col] = value
-        optimized_data.append(optimized_row)
-    return optimized_data
+    if shape.has_count and not shape.has_group_by:
+        return sql
+    return f"{sql.rstrip(';')} LIMIT {max_rows}"
 
-@mcp.tool()
-def snowflake_query(sql: str, max_rows: int = DEFAULT_MAX_ROWS) -> Dict[str, Any]:
+def normalize_sql(sql: str) -> str:
+    """Canonical form of a stripped statement for result cache keys"""
+    parts = _QUOTED_RE.split(sql.rstrip(';'))
+    parts[::2] = [_WHITESPACE_RE.sub(' ', part).lower() for part in parts[::2]]
+    return ''.join(parts).strip()
+
+def cache_get(key: Tuple[str, int, bool]) -> Optional[Dict[str, Any]]:
+    """Return a cached read result that is still within RESULT_CACHE_TTL"""
+    cached = _RESULT_CACHE.get(key)
+    if cached is None:
+        return None
+    if time.monotonic() - cached[0] > RESULT_CACHE_TTL:
+        del _RESULT_CACHE[key]
+        return None
+    _RESULT_CACHE.move_to_end(key)
+    return cached[1]
+
+def cache_put(key: Tuple[str, int, bool], result: Dict[str, Any]):
+    _RESULT_CACHE[key] = (time.monotonic(), result)
+    _RESULT_CACHE.move_to_end(key)
+    if len(_RESULT_CACHE) > RESULT_CACHE_MAXSIZE:
+        _RESULT_CACHE.popitem(last=False)
+
+def invalidate_cache():
+    """Drop all cached reads after a write"""
+    global _CACHE_GENERATION
+    _CACHE_GENERATION += 1
+    _RESULT_CACHE.clear()
+
+def truncate(value):
+    """Shorten long strings in large columns to save tokens"""
+    if isinstance(value, str) and len(value) > TRUNCATE_CHARS:
+        return f"{value[:TRUNCATE_CHARS]}... [truncated {len(value) - TRUNCATE_CHARS} chars]"
+    return value
+
+@functools.lru_cache(maxsize=256)
+def large_column_mask(columns: Tuple[str, ...]) -> Tuple[bool, ...]:
+    """Which columns match LARGE_PATTERNS; memoized since the same result shapes recur"""
+    return tuple(any(pattern in col.upper() for pattern in LARGE_PATTERNS) for col in columns)
+
+@functools.lru_cache(maxsize=None)
+def truncate_literals(string_type: "pa.DataType") -> Tuple["pa.Scalar", "pa.Scalar", "pa.Scalar"]:
+    """Arrow scalars for the truncation marker, built once per string type"""
+    return tuple(pa.scalar(text, string_type) for text in ("... [truncated ", " chars]", ""))
+
+def truncate_arrow(table: "pa.Table", large_indices: List[int]) -> "pa.Table":
+    """truncate() for the large string columns of an Arrow batch, one C kernel per column"""
+    for i in large_indices:
+        column = table.column(i)
+        if not (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+            continue
+        lengths = pc.utf8_length(column)
+        too_long = pc.greater(lengths, TRUNCATE_CHARS)
+        if not pc.any(too_long).as_py():
+            continue
+        dropped = pc.cast(pc.subtract(lengths, TRUNCATE_CHARS), column.type)
+        prefix, suffix, sep = truncate_literals(column.type)
+        truncated = pc.binary_join_element_wise(
+            pc.utf8_slice_codeunits(column, 0, TRUNCATE_CHARS), prefix, dropped, suffix, sep
+        )
+        table = table.set_column(i, table.field(i), pc.if_else(too_long, truncated, column))
+    return table
+
+def fetch_rows(cursor, max_rows: int, on_batch: Optional[Callable[[int], None]] = None, compact: bool = False) -> Tuple[List[str], List]:
     """
-    Execute SQL query on Snowflake (V2.2 Enhanced)
+    Fetch up to max_rows as dicts, truncating large columns as rows are built
     
-    NEW in V2.2: MERGE, Transactions (BEGIN/COMMIT/ROLLBACK), Dynamic LIMIT (1-1000)
+    Arrow result chunks are decoded in C when available; on_batch is called
+    with the running row count after each one. compact returns each row as a
+    list in column order instead, so column names aren't repeated per row.
+    Returns (columns, rows).
     """
+    columns = tuple(d[0] for d in cursor.description) if cursor.description else ()
+    large_mask = large_column_mask(columns)
+    
+    try:
+        batches = cursor.fetch_arrow_batches()
+    except NotSupportedError:
+        # SHOW/DESCRIBE and other JSON-format results have no Arrow chunks
+        batches = None
+    
+    if batches is None:
+        if compact:
+            rows = [list(row) for row in cursor.fetchmany(max_rows)]
+            keys = range(len(columns))
+        else:
+            rows = [dict(zip(columns, row)) for row in cursor.fetchmany(max_rows)]
+            keys = columns
+        # Column-major: rows are built in C, then only the large columns are revisited
+        for key, large in zip(keys, large_mask):
+            if large:
+                for row in rows:
+                    row[key] = truncate(row[key])
+        return list(columns), rows
+    
+    # Stop pulling chunks once max_rows is reached; batches are converted one at
+    # a time since timestamp precision can differ between them
+    large_indices = [i for i, large in enumerate(large_mask) if large]
+    rows = []
+    for table in batches:
+        table = table.slice(0, max_rows - len(rows))
+        if large_indices:
+            table = truncate_arrow(table, large_indices)
+        if compact:
+            rows.extend(map(list, zip(*(column.to_pylist() for column in table.columns))))
+        else:
+            rows.extend(table.to_pylist())
+        if on_batch:
+            on_batch(len(rows))
+        if len(rows) >= max_rows:
+            break
+    return list(columns), rows
+
+async def run_read(sql: str, max_rows: int, ctx: Optional[Context] = None, compact: bool = False) -> Dict[str, Any]:
+    """Execute a SELECT/SHOW/DESCRIBE and return its result payload"""
+    on_batch = None
+    if ctx is not None:
+        # Tool results are a single message, but progress notifications stream
+        # over streamable-http while the fetch thread works through the batches
+        loop = asyncio.get_running_loop()
+        def on_batch(rows: int):
+            asyncio.run_coroutine_threadsafe(ctx.report_progress(rows, max_rows), loop)
+    
+    async with acquire() as conn:
+        cursor = conn.cursor()
+        # Reads can run for minutes; poll instead of blocking on execute()
+        await execute_polling(conn, cursor, sql)
+        columns, data = await asyncio.to_thread(fetch_rows, cursor, max_rows, on_batch, compact)
+        cursor.close()
+    return {"success": True, "data": data, "columns": columns, "row_count": len(data), "optimized": True, "version": VERSION}
+
+async def cached_read(sql: str, max_rows: int, ctx: Optional[Context] = None, compact: bool = False) -> Dict[str, Any]:
+    """run_read() through the result cache, coalescing identical in-flight reads"""
+    if RESULT_CACHE_TTL <= 0 or _NONDETERMINISTIC_RE.search(sql):
+        return await run_read(sql, max_rows, ctx, compact)
+    
+    key = (normalize_sql(sql), max_rows, compact)
+    while True:
+        cached = cache_get(key)
+        if cached is not None:
+            return {**cached, "cached": True}
+        pending = _PENDING_READS.get(key)
+        if pending is None:
+            break
+        await pending.wait()
+    
+    _PENDING_READS[key] = done = asyncio.Event()
+    generation = _CACHE_GENERATION
+    try:
+        result = await run_read(sql, max_rows, ctx, compact)
+        if generation == _CACHE_GENERATION:
+            cache_put(key, result)
+        return result
+    finally:
+        del _PENDING_READS[key]
+        done.set()
+
+def collect_batch(cursor, operations: List[str], max_rows: int, compact: bool) -> List[Dict[str, Any]]:
+    """Walk the per-statement results of a multi-statement execute()"""
+    results = []
+    for i, operation in enumerate(operations):
+        if i:
+            cursor.nextset()
+        if operation in READ_OPERATIONS:
+            columns, data = fetch_rows(cursor, max_rows, compact=compact)
+            results.append({"operation": operation, "data": data, "columns": columns, "row_count": len(data)})
+        else:
+            rows_affected = cursor.rowcount
+            results.append({"operation": operation, "rows_affected": rows_affected if rows_affected >= 0 else "N/A"})
+    return results
+
+async def run_batch(statements: List[str], max_rows: int, compact: bool) -> Dict[str, Any]:
+    """Validate every statement, then run them all in one round-trip"""
+    operations, batch, changes_session = [], [], False
+    for n, statement in enumerate(statements, 1):
+        shape = classify(statement)
+        error = check_statement(shape)
+        if error:
+            return {"success": False, "error": f"Statement {n}: {error}", "version": VERSION}
+        operations.append(shape.operation)
+        batch.append(enforce_limit(statement, shape, max_rows))
+        changes_session = changes_session or shape.changes_session
+    
+    # A transaction left open by a failed statement, or session settings, must not reach the next caller
+    async with acquire(discard=changes_session) as conn:
+        cursor = conn.cursor()
+        try:
+            await asyncio.to_thread(cursor.execute, ";\n".join(batch), num_statements=len(batch))
+        finally:
+            if any(operation not in READ_OPERATIONS for operation in operations):
+                invalidate_cache()
+        results = await asyncio.to_thread(collect_batch, cursor, operations, max_rows, compact)
+        cursor.close()
+    
+    return {"success": True, "results": results, "statement_count": len(results), "optimized": True, "version": VERSION}
+
+async def run_query(sql: str, max_rows: int, ctx: Optional[Context] = None, compact: bool = False) -> Dict[str, Any]:
+    """Validate and execute one snowflake_query request; errors are returned, not raised"""
     try:
         if max_rows < 1 or max_rows > MAX_ROWS_LIMIT:
-            return {"success": False, "error": f"max_rows must be between 1 and {MAX_ROWS_LIMIT}", "version": "V2.2"}
-        
-        sql_upper = sql.strip().upper()
+            return {"success": False, "error": _MAX_ROWS_ERROR, "version": VERSION}
         
-        # V2.2: Added MERGE and transaction support
-        allowed_starts = ['SELECT', 'SHOW', 'DESCRIBE', 'CREATE', 'ALTER', 'INSERT', 'UPDATE', 'DELETE', 'MERGE', 'BEGIN', 'COMMIT', 'ROLLBACK']
-        if not any(sql_upper.startswith(k) for k in allowed_starts):
-            return {"success": False, "error": f"Only {', '.join(allowed_starts)} allowed", "version": "V2.2"}
+        # Semicolon-separated batches run in one round-trip; each statement is checked on its own.
+        # A single statement also goes through the splitter so comments and stray semicolons
+        # can't hide an appended LIMIT; enforce_limit and the cache key expect stripped SQL
+        statements = split_statements(sql)
+        if len(statements) > 1:
+            return await run_batch(statements, max_rows, compact)
+        sql = statements[0] if statements else ""
         
-        extremely_dangerous = ['DROP', 'TRUNCATE']
-        if any(k in sql_upper for k in extremely_dangerous):
-            return {"success": False, "error": "DROP/TRUNCATE not allowed for safety", "version": "V2.2"}
+        shape = classify(sql)
+        error = check_statement(shape)
+        if error:
+            return {"success": False, "error": error, "version": VERSION}
+        operation = shape.operation
+        # Consecutive calls may run on different pooled connections, and one that
+        # changed session state is discarded, so on its own it would do nothing
+        if operation in ('BEGIN', 'COMMIT', 'ROLLBACK'):
+            return {"success": False, "error": _TRANSACTION_ERROR, "version": VERSION}
+        if shape.changes_session:
+            return {"success": False, "error": _SESSION_STATE_ERROR, "version": VERSION}
         
-        if not sql_upper.startswith('MERGE'):
-            if sql_upper.startswith('UPDATE') or sql_upper.startswith('DELETE'):
-                if 'WHERE' not in sql_upper:
-                    return {"success": False, "error": "UPDATE/DELETE requires WHERE clause", "version": "V2.2"}
-        
-        optimized_sql = enforce_limit(sql, max_rows)
+        optimized_sql = enforce_limit(sql, shape, max_rows)
         if optimized_sql != sql:
-            logger.info(f"V2.2: Added LIMIT {max_rows}")
-        
-        conn = get_snowflake_connection()
-        cursor = conn.cursor()
-        cursor.execute(optimized_sql)
+            logger.debug("%s: Added LIMIT %d", VERSION, max_rows)
         
-        if sql_upper.startswith(('SELECT', 'SHOW', 'DESCRIBE')):
-            results = cursor.fetchmany(max_rows)
-            columns = [d[0] for d in cursor.description] if cursor.description else []
-            data = [dict(zip(columns, row)) for row in results]
-            optimized_data = optimize_columns(data, columns)
-            cursor.close()
-            conn.close()
-            return {"success": True, "data": optimized_data, "columns": columns, "row_count": len(optimized_data), "optimized": True, "version": "V2.2"}
+        if operation in READ_OPERATIONS:
+            return await cached_read(optimized_sql, max_rows, ctx, compact)
         
-        elif sql_upper.startswith(('BEGIN', 'COMMIT', 'ROLLBACK')):
-            cursor.close()
-            conn.close()
-            operation = sql_upper.split()[0]
-            return {"success": True, "message": f"{operation} executed", "transaction_control": True, "version": "V2.2"}
-        
-        else:
+        # Writes run synchronously: one execute() round-trip that also reports rowcount
+        async with acquire() as conn:
+            cursor = conn.cursor()
+            try:
+                await asyncio.to_thread(cursor.execute, optimized_sql)
+            finally:
+                invalidate_cache()
+            
             rows_affected = cursor.rowcount
             cursor.close()
-            conn.close()
-            operation = sql_upper.split()[0]
-            return {"success": True, "message": f"{operation} executed", "rows_affected": rows_affected if rows_affected >= 0 else "N/A", "version": "V2.2"}
+            return {"success": True, "message": f"{operation} executed", "rows_affected": rows_affected if rows_affected >= 0 else "N/A", "version": VERSION}
             
     except Exception as e:
-        logger.error(f"Query failed: {e}")
-        return {"success": False, "error": str(e), "version": "V2.2"}
+        logger.error("Query failed: %s", e)
+        return {"success": False, "error": str(e), "version": VERSION}
 
 @mcp.tool()
-def connection_status() -> Dict[str, Any]:
-    """Check Snowflake connection status"""
+async def snowflake_query(sql: str, max_rows: int = DEFAULT_MAX_ROWS, compact: bool = False, ctx: Optional[Context] = None) -> Dict[str, Any]:
+    """
+    Execute SQL query on Snowflake (V2.2 Enhanced)
+    
+    NEW in V2.2: MERGE, Transactions (BEGIN/COMMIT/ROLLBACK), Dynamic LIMIT (1-1000)
+    
+    Several statements separated by semicolons run as one batch and return
+    per-statement "results"; a transaction, or session settings and the
+    statements that rely on them, must be sent whole as one batch. Reads
+    report progress per fetched batch when the client asks for progress
+    notifications.
+    
+    compact=True returns "data" rows as lists in "columns" order instead of
+    dicts, which roughly halves the response for wide results.
+    """
+    return await run_query(sql, max_rows, ctx, compact)
+
+@mcp.tool()
+async def snowflake_query_many(queries: List[str], max_rows: int = DEFAULT_MAX_ROWS, compact: bool = False) -> Dict[str, Any]:
+    """
+    Run independent queries concurrently, each on its own pooled connection
+    
+    Every entry is handled exactly like a snowflake_query call and results keep
+    the input order. Statements that depend on each other (e.g. a transaction)
+    belong in one semicolon-separated snowflake_query batch instead.
+    """
+    results = await asyncio.gather(*(run_query(sql, max_rows, compact=compact) for sql in queries))
+    return {"success": all(result["success"] for result in results), "results": results, "query_count": len(results), "version": VERSION}
+
+@mcp.tool()
+async def batch_insert(table: str, columns: List[str], values: List[List[Any]]) -> Dict[str, Any]:
+    """
+    Insert many rows in one operation (V2.2)
+    
+    Values are sent as bind parameters through executemany, never spliced into
+    the SQL text; table and column names must be plain or double-quoted identifiers.
+    """
+    if not _TABLE_RE.match(table):
+        return {"success": False, "error": f"Invalid table name: {table}", "version": VERSION}
+    if not columns:
+        return {"success": False, "error": "columns must not be empty", "version": VERSION}
+    for column in columns:
+        if not _COLUMN_RE.match(column):
+            return {"success": False, "error": f"Invalid column name: {column}", "version": VERSION}
+    if not values:
+        return {"success": False, "error": "values must not be empty", "version": VERSION}
+    if len(values) > BATCH_INSERT_MAX_ROWS:
+        return {"success": False, "error": f"Too many rows: {len(values)} (maximum {BATCH_INSERT_MAX_ROWS})", "version": VERSION}
+    for n, row in enumerate(values, 1):
+        if len(row) != len(columns):
+            return {"success": False, "error": f"Row {n} has {len(row)} values, expected {len(columns)}", "version": VERSION}
+    
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    
+    # One chunk is one statement and already atomic; several share a transaction
+    chunked = len(values) > BATCH_INSERT_CHUNK_ROWS
+    
+    def _run_sync(cursor) -> int:
+        if chunked:
+            cursor.execute("BEGIN")
+        inserted = 0
+        for start in range(0, len(values), BATCH_INSERT_CHUNK_ROWS):
+            cursor.executemany(sql, values[start:start + BATCH_INSERT_CHUNK_ROWS])
+            inserted += cursor.rowcount
+        if chunked:
+            cursor.execute("COMMIT")
+        return inserted
+    
     try:
-        conn = get_snowflake_connection()
+        # Check-in rolls back and closes a chunked insert's connection, so a failed
+        # chunk (or COMMIT) can't leave an open transaction in the pool
+        async with acquire(discard=chunked) as conn:
+            cursor = conn.cursor()
+            try:
+                rows_inserted = await asyncio.to_thread(_run_sync, cursor)
+            finally:
+                invalidate_cache()
+            cursor.close()
+        
+        return {"success": True, "message": f"Inserted {rows_inserted} rows into {table}", "rows_inserted": rows_inserted, "version": VERSION}
+    except Exception as e:
+        logger.error("Batch insert failed: %s", e)
+        return {"success": False, "error": str(e), "version": VERSION}
+
+@mcp.tool()
+async def connection_status() -> Dict[str, Any]:
+    """Check Snowflake connection status"""
+    global _STATUS_CACHE
+    # User/role/database/schema don't change between polls; only the clock does
+    if _STATUS_CACHE and time.monotonic() - _STATUS_CACHE[0] < STATUS_CACHE_TTL:
+        return {**_STATUS_CACHE[1], "timestamp": datetime.now(timezone.utc).isoformat(), "cached": True}
+    
+    def _run_sync(conn):
         cursor = conn.cursor()
         cursor.execute("SELECT CURRENT_TIMESTAMP(), CURRENT_USER(), CURRENT_ROLE(), CURRENT_DATABASE(), CURRENT_SCHEMA()")
         result = cursor.fetchone()
         cursor.close()
-        conn.close()
+        return result
+    
+    try:
+        async with acquire() as conn:
+            result = await asyncio.to_thread(_run_sync, conn)
         
-        return {
+        status = {
             "success": True,
             "connected": True,
             "timestamp": str(result[0]),
@@ -158,26 +721,17 @@ def connection_status() -> Dict[str, Any]:
             "role": result[2],
             "database": result[3],
             "schema": result[4],
-            "auth_method": "JWT",
-            "version": "V2.2",
-            "capabilities": [
-                "READ: SELECT/SHOW/DESCRIBE",
-                "WRITE: INSERT/UPDATE/DELETE (with WHERE)",
-                "UPSERT: MERGE (NEW!)",
-                "TRANSACTIONS: BEGIN/COMMIT/ROLLBACK (NEW!)",
-                "DDL: CREATE/ALTER",
-                "BLOCKED: DROP/TRUNCATE"
-            ],
-            "limits": {"max_rows": f"1-{MAX_ROWS_LIMIT}", "default_rows": DEFAULT_MAX_ROWS},
-            "optimizations": ["Auto-LIMIT", "Token-optimized", "Column truncation", "Dynamic limits (NEW!)"]
+            **STATIC_STATUS,
         }
+        _STATUS_CACHE = (time.monotonic(), status)
+        return status
     except Exception as e:
-        logger.error(f"Connection failed: {e}")
-        return {"success": False, "connected": False, "error": str(e), "version": "V2.2"}
+        logger.error("Connection failed: %s", e)
+        return {"success": False, "connected": False, "error": str(e), "version": VERSION}
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8080))
-    logger.info(f"🚀 Snowflake MCP V2.2 starting on port {port}")
+    logger.info("🚀 Snowflake MCP %s starting on port %d", VERSION, port)
     logger.info("✅ NEW: MERGE/UPSERT | Transactions | Dynamic LIMIT (1-1000)")
     
     asyncio.run(
@@ -185,5 +739,6 @@ if __name__ == "__main__":
             transport="streamable-http",
             host="0.0.0.0",
             port=port,
-        )
+        ),
+        loop_factory=uvloop.new_event_loop if uvloop else None,
     )
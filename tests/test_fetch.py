@@ -0,0 +1,97 @@
+"""Result fetching for single-statement reads"""
+import asyncio
+from contextlib import asynccontextmanager
+
+import pyarrow as pa
+import pytest
+from snowflake.connector.errors import NotSupportedError
+
+import server
+
+LONG = "x" * 900
+
+
+class Cursor:
+    """Stands in for a cursor after query_result(): description is set, rows come in Arrow chunks"""
+
+    def __init__(self, columns, rows, arrow=True):
+        self._columns = columns
+        self._rows = rows
+        self._arrow = arrow
+        self.description = None
+        self.sfqid = None
+        self.calls = []
+
+    def execute_async(self, sql):
+        self.calls.append("execute_async")
+        self.sfqid = "01-query"
+
+    def query_result(self, query_id):
+        self.calls.append(("query_result", query_id))
+        self.description = [(name,) for name in self._columns]
+        return self
+
+    def fetch_arrow_batches(self):
+        if not self._arrow:
+            raise NotSupportedError
+        table = pa.table({name: [row[i] for row in self._rows] for i, name in enumerate(self._columns)})
+        return iter([table.slice(0, 1), table.slice(1)])
+
+    def fetchmany(self, size):
+        return self._rows[:size]
+
+    def close(self):
+        pass
+
+
+class Conn:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.polls = 2
+
+    def cursor(self):
+        return self._cursor
+
+    def get_query_status_throw_if_error(self, query_id):
+        self.polls -= 1
+        return self.polls
+
+    def is_still_running(self, status):
+        return status > 0
+
+
+ROWS = [(1, LONG), (2, "short"), (3, LONG)]
+
+
+@pytest.mark.parametrize("arrow", [True, False])
+def test_fetch_rows_truncates_large_columns(arrow):
+    cursor = Cursor(["ID", "JSON_DATA"], ROWS, arrow).query_result("q")
+    columns, rows = server.fetch_rows(cursor, 10)
+    assert columns == ["ID", "JSON_DATA"]
+    assert [row["ID"] for row in rows] == [1, 2, 3]
+    assert rows[0]["JSON_DATA"] == "x" * 500 + "... [truncated 400 chars]"
+    assert rows[1]["JSON_DATA"] == "short"
+
+
+@pytest.mark.parametrize("arrow", [True, False])
+def test_fetch_rows_compact_truncates(arrow):
+    cursor = Cursor(["ID", "DESCRIPTION"], ROWS, arrow).query_result("q")
+    columns, rows = server.fetch_rows(cursor, 2, compact=True)
+    assert columns == ["ID", "DESCRIPTION"]
+    assert rows == [[1, "x" * 500 + "... [truncated 400 chars]"], [2, "short"]]
+
+
+def test_run_read_fetches_result_once_polling_ends(monkeypatch):
+    cursor = Cursor(["ID", "JSON_DATA"], ROWS)
+
+    @asynccontextmanager
+    async def acquire():
+        yield Conn(cursor)
+
+    monkeypatch.setattr(server, "acquire", acquire)
+    result = asyncio.run(server.run_read("SELECT * FROM T LIMIT 20", 20))
+    # No get_results_from_sfqid: no second status check and no RESULT_SCAN query
+    assert cursor.calls == ["execute_async", ("query_result", "01-query")]
+    assert result["columns"] == ["ID", "JSON_DATA"]
+    assert result["row_count"] == 3
+    assert result["data"][2]["JSON_DATA"].endswith("... [truncated 400 chars]")
@@ -0,0 +1,94 @@
+"""Token quota is tracked per (token, X-RateLimit-Resource) bucket"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import github_server
+
+
+@pytest.fixture
+def tokens(monkeypatch):
+    monkeypatch.setattr(github_server, "TOKENS", ["a", "b"])
+    monkeypatch.setattr(github_server, "TOKEN_LIMITS", {})
+    return github_server
+
+
+def response(resource, limit, remaining, status=200):
+    headers = {
+        "X-RateLimit-Resource": resource,
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(int(time.time()) + 60),
+    }
+    return httpx.Response(status, headers=headers)
+
+
+@pytest.mark.parametrize("url, resource", [
+    ("https://api.github.com/repos/o/r/branches", "core"),
+    ("https://api.github.com/search/code?q=x", "code_search"),
+    ("https://api.github.com/search/issues?q=x", "search"),
+    ("https://api.github.com/graphql", "graphql"),
+])
+def test_rate_limit_resource(url, resource):
+    assert github_server.rate_limit_resource(url) == resource
+
+
+def test_search_usage_does_not_skew_core(tokens):
+    tokens.record_rate_limit("a", "code_search", response("code_search", 10, 9))
+    tokens.record_rate_limit("b", "core", response("core", 5000, 4000))
+    # a's low code_search quota says nothing about its (untouched) core quota
+    assert tokens.pick_token("core") == "a"
+    assert tokens.pick_token("code_search") == "b"
+
+
+def test_benched_search_token_still_serves_core(tokens):
+    tokens.record_rate_limit("a", "code_search", response("code_search", 10, 0, status=403), cooldown=60)
+    tokens.record_rate_limit("b", "code_search", response("code_search", 10, 0, status=403), cooldown=60)
+    assert not tokens.has_available_token("code_search")
+    assert tokens.has_available_token("core")
+    assert tokens.has_available_token("graphql")
+
+
+def test_response_bucket_overrides_url_guess(tokens):
+    tokens.record_rate_limit("a", "core", response("search", 30, 1))
+    assert tokens.TOKEN_LIMITS[("a", "search")].remaining == 1
+    assert tokens.available_quota(tokens.rate_limit_info("a", "core"), time.time()) == 5000
+
+
+def mock_client(monkeypatch, handler):
+    monkeypatch.setattr(github_server, "CLIENT", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+def exhausted(request):
+    headers = {"X-RateLimit-Resource": "core", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(time.time()) + 3000)}
+    return httpx.Response(403, headers=headers, json={"message": "API rate limit exceeded"})
+
+
+def test_exhausted_quota_far_from_reset_fails_fast(tokens, monkeypatch):
+    monkeypatch.setattr(github_server, "TOKENS", ["a"])
+    calls = []
+
+    def handler(request):
+        calls.append(request.headers["Authorization"])
+        return exhausted(request)
+
+    mock_client(monkeypatch, handler)
+    started = time.monotonic()
+    response = asyncio.run(github_server.github_request("GET", "https://api.github.com/repos/o/r/branches"))
+    assert response.status_code == 403
+    assert calls == ["Bearer a"]
+    assert time.monotonic() - started < 5
+
+
+def test_exhausted_token_fails_over_to_another(tokens, monkeypatch):
+    def handler(request):
+        if request.headers["Authorization"] == "Bearer a":
+            return exhausted(request)
+        return httpx.Response(200, json=[])
+
+    tokens.record_rate_limit("b", "core", response("core", 5000, 10))
+    mock_client(monkeypatch, handler)
+    result = asyncio.run(github_server.github_request("GET", "https://api.github.com/repos/o/r/branches"))
+    assert result.status_code == 200
@@ -0,0 +1,116 @@
+"""Pooled connections must come back clean or not at all"""
+import asyncio
+import threading
+
+import pytest
+
+import server
+
+
+class Conn:
+    def __init__(self):
+        self.calls = []
+        self.closed = False
+
+    def rollback(self):
+        self.calls.append("rollback")
+
+    def close(self):
+        self.calls.append("close")
+        self.closed = True
+
+    def is_closed(self):
+        return self.closed
+
+
+def drain():
+    conns = []
+    while not server._POOL.empty():
+        conns.append(server._POOL.get_nowait()[0])
+    return conns
+
+
+def test_checkin_pools_clean_connection():
+    conn = Conn()
+    server._checkin(conn, server.time.monotonic(), broken=False)
+    assert drain() == [conn]
+    assert conn.calls == []
+
+
+def test_checkin_discard_rolls_back_and_closes():
+    conn = Conn()
+    server._checkin(conn, server.time.monotonic(), broken=False, discard=True)
+    assert drain() == []
+    assert conn.calls == ["rollback", "close"]
+
+
+def test_checkin_broken_closes_without_rollback():
+    conn = Conn()
+    server._checkin(conn, server.time.monotonic(), broken=True, discard=True)
+    assert drain() == []
+    assert conn.calls == ["close"]
+
+
+def test_cancelled_checkout_closes_its_connection(monkeypatch):
+    conn = Conn()
+    started = threading.Event()
+    release = threading.Event()
+
+    def build():
+        started.set()
+        release.wait(5)
+        return conn
+
+    monkeypatch.setattr(server, "_build_connection", build)
+    drain()
+
+    async def main():
+        async def use():
+            async with server.acquire():
+                pass
+
+        task = asyncio.create_task(use())
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        release.set()
+        for _ in range(100):
+            if conn.closed:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert conn.calls == ["close"]
+    assert drain() == []
+    assert server._POOL_SLOTS._value == server.SNOWFLAKE_POOL_MAX
+
+
+def test_failed_chunked_batch_insert_is_rolled_back_and_closed(monkeypatch):
+    conn = Conn()
+
+    class Cursor:
+        rowcount = 0
+
+        def execute(self, sql):
+            conn.calls.append(sql)
+
+        def executemany(self, sql, rows):
+            if "executemany" in conn.calls:
+                raise RuntimeError("bind failed")
+            conn.calls.append("executemany")
+            self.rowcount = len(rows)
+
+        def close(self):
+            pass
+
+    conn.cursor = Cursor
+    monkeypatch.setattr(server, "_build_connection", lambda: conn)
+    drain()
+    values = [[1]] * (server.BATCH_INSERT_CHUNK_ROWS + 1)
+    # Older FastMCP releases wrap tools in an object exposing the function as .fn
+    batch_insert = getattr(server.batch_insert, "fn", server.batch_insert)
+    result = asyncio.run(batch_insert("T", ["A"], values))
+    assert result["success"] is False
+    assert conn.calls == ["BEGIN", "executemany", "rollback", "close"]
+    assert drain() == []
@@ -0,0 +1,152 @@
+"""Statement splitting and classification: the safety gate in front of every query"""
+import asyncio
+
+import pytest
+
+import server
+
+PROC = "CREATE PROCEDURE p() RETURNS VARCHAR LANGUAGE SQL AS $$ BEGIN SELECT 1; RETURN 'ok'; END; $$"
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT 1", ["SELECT 1"]),
+    ("SELECT 1;", ["SELECT 1"]),
+    ("SELECT 1; ;", ["SELECT 1"]),
+    ("SELECT 1; SELECT 2", ["SELECT 1", "SELECT 2"]),
+    ("SELECT ';' FROM t; SELECT 2", ["SELECT ';' FROM t", "SELECT 2"]),
+    ("SELECT 'it''s;' FROM t", ["SELECT 'it''s;' FROM t"]),
+    ("SELECT 'it\\'s;' FROM t", ["SELECT 'it\\'s;' FROM t"]),
+    ('SELECT "a;b" FROM t', ['SELECT "a;b" FROM t']),
+    ("SELECT 1; -- note", ["SELECT 1"]),
+    ("SELECT 1 -- ; SELECT 2\n; SELECT 3", ["SELECT 1", "SELECT 3"]),
+    ("SELECT 1 // ; SELECT 2", ["SELECT 1"]),
+    ("SELECT /* ; */ 1", ["SELECT   1"]),
+    ("SELECT '--' FROM t", ["SELECT '--' FROM t"]),
+    (PROC, [PROC]),
+    ("", []),
+])
+def test_split_statements(sql, expected):
+    assert server.split_statements(sql) == expected
+
+
+def test_split_statements_comment_bypass():
+    # Quotes inside comments must not hide the statement boundaries around them
+    sql = "SELECT 1 /* ' */; GRANT ROLE ACCOUNTADMIN TO USER x; SELECT 3 /* ' */; SELECT 0 /* ; SELECT 8; SELECT 9 */"
+    statements = server.split_statements(sql)
+    assert statements == ["SELECT 1", "GRANT ROLE ACCOUNTADMIN TO USER x", "SELECT 3", "SELECT 0"]
+    assert server.check_statement(server.classify(statements[1])) == server._ALLOWED_ERROR
+
+
+@pytest.mark.parametrize("sql", ["SELECT 'abc", 'SELECT "abc', "SELECT $$ abc", "SELECT 1 /* abc", "SELECT 1; SELECT 'x"])
+def test_split_statements_unterminated(sql):
+    with pytest.raises(ValueError):
+        server.split_statements(sql)
+
+
+def test_run_query_rejects_statement_hidden_by_comments():
+    sql = "SELECT 1 /* ' */; GRANT ROLE ACCOUNTADMIN TO USER x; SELECT 3 /* ' */; SELECT 0 /* ; SELECT 8; SELECT 9 */"
+    result = asyncio.run(server.run_query(sql, 20))
+    assert result == {"success": False, "error": f"Statement 2: {server._ALLOWED_ERROR}", "version": server.VERSION}
+
+
+@pytest.mark.parametrize("sql", ["SELECT 1; ;", "SELECT 1; -- note", "SELECT 1 -- note", "SELECT 1 /* x */;"])
+def test_run_query_single_statement_gets_limit(sql, monkeypatch):
+    sent = []
+
+    async def cached_read(sql, max_rows, ctx=None, compact=False):
+        sent.append(sql)
+        return {"success": True}
+
+    monkeypatch.setattr(server, "cached_read", cached_read)
+    assert asyncio.run(server.run_query(sql, 20)) == {"success": True}
+    assert sent == ["SELECT 1 LIMIT 20"]
+
+
+WHERE_ERROR = "UPDATE/DELETE requires WHERE clause"
+DROP_ERROR = "DROP/TRUNCATE not allowed for safety"
+
+
+@pytest.mark.parametrize("sql, operation, error", [
+    ("SELECT * FROM t", "SELECT", None),
+    ("  select * from t", "SELECT", None),
+    ("show tables", "SHOW", None),
+    ("DESCRIBE TABLE t", "DESCRIBE", None),
+    ("INSERT INTO t VALUES (1)", "INSERT", None),
+    ("MERGE INTO t USING s ON t.id = s.id WHEN MATCHED THEN UPDATE SET a = 1", "MERGE", None),
+    ("begin", "BEGIN", None),
+    ("GRANT ROLE r TO USER u", None, server._ALLOWED_ERROR),
+    ("SELECTX 1", None, server._ALLOWED_ERROR),
+    ("DROP TABLE t", None, server._ALLOWED_ERROR),
+    ("/* c */ SELECT 1", None, server._ALLOWED_ERROR),
+    ("CREATE TABLE t AS SELECT 1 FROM s WHERE 1 = 0; DROP TABLE s", "CREATE", DROP_ERROR),
+    ("ALTER TABLE t DROP COLUMN c", "ALTER", DROP_ERROR),
+    ("DELETE FROM t WHERE note = 'drop'", "DELETE", DROP_ERROR),
+    ("DELETE FROM t -- drop", "DELETE", DROP_ERROR),
+    ("SELECT dropped_at FROM t", "SELECT", None),
+    ("DELETE FROM t WHERE id = 1", "DELETE", None),
+    ("DELETE FROM t", "DELETE", WHERE_ERROR),
+    ("UPDATE t SET a = 'where'", "UPDATE", WHERE_ERROR),
+    ("UPDATE t SET a = 'it\\'s where'", "UPDATE", WHERE_ERROR),
+    ("UPDATE t SET a = 'it''s where'", "UPDATE", WHERE_ERROR),
+    ('UPDATE t SET "where" = 1', "UPDATE", WHERE_ERROR),
+    ("UPDATE t SET a = $$ where $$", "UPDATE", WHERE_ERROR),
+    ("UPDATE t SET a = 1 -- where", "UPDATE", WHERE_ERROR),
+    ("UPDATE t SET a = 1 /* where */", "UPDATE", WHERE_ERROR),
+    ("UPDATE t SET a = 1 WHERE b = '--'", "UPDATE", None),
+    ("UPDATE t SET nowhere = 1", "UPDATE", WHERE_ERROR),
+])
+def test_check_statement(sql, operation, error):
+    shape = server.classify(sql)
+    assert shape.operation == operation
+    assert server.check_statement(shape) == error
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM t", "SELECT * FROM t LIMIT 5"),
+    ("SELECT * FROM t;", "SELECT * FROM t LIMIT 5"),
+    ("SELECT * FROM t LIMIT 3", "SELECT * FROM t LIMIT 3"),
+    ("select * from t limit 3", "select * from t limit 3"),
+    ("SELECT rate_limit FROM t", "SELECT rate_limit FROM t LIMIT 5"),
+    ("SELECT limit_id FROM t", "SELECT limit_id FROM t LIMIT 5"),
+    ("SELECT * FROM t WHERE msg = 'rate limit hit'", "SELECT * FROM t WHERE msg = 'rate limit hit' LIMIT 5"),
+    ("SELECT * FROM t WHERE msg = 'it\\'s limit'", "SELECT * FROM t WHERE msg = 'it\\'s limit' LIMIT 5"),
+    ('SELECT "LIMIT" FROM t', 'SELECT "LIMIT" FROM t LIMIT 5'),
+    ("SELECT $$ limit $$ FROM t", "SELECT $$ limit $$ FROM t LIMIT 5"),
+    ("SELECT COUNT(*) FROM t", "SELECT COUNT(*) FROM t"),
+    ("SELECT count (*) FROM t", "SELECT count (*) FROM t"),
+    ("SELECT a, COUNT(*) FROM t GROUP BY a", "SELECT a, COUNT(*) FROM t GROUP BY a LIMIT 5"),
+    ("SELECT account_count FROM t", "SELECT account_count FROM t LIMIT 5"),
+    ("SELECT 'count(' FROM t", "SELECT 'count(' FROM t LIMIT 5"),
+    ("SHOW TABLES", "SHOW TABLES"),
+    ("INSERT INTO t SELECT * FROM s", "INSERT INTO t SELECT * FROM s"),
+])
+def test_enforce_limit(sql, expected):
+    assert server.enforce_limit(sql, server.classify(sql), 5) == expected
+
+
+@pytest.mark.parametrize("sql, changes_session", [
+    ("BEGIN", True),
+    ("begin transaction", True),
+    ("ALTER SESSION SET TIMEZONE = 'UTC'", True),
+    ("CREATE TEMPORARY TABLE t (a INT)", True),
+    ("create or replace temp table t (a int)", True),
+    ("CREATE LOCAL TEMPORARY TABLE t (a INT)", True),
+    ("ALTER TABLE t ADD COLUMN c INT", False),
+    ("CREATE TABLE temp_results (a INT)", False),
+    ("COMMIT", False),
+    ("SELECT 'ALTER SESSION'", False),
+])
+def test_classify_changes_session(sql, changes_session):
+    assert server.classify(sql).changes_session is changes_session
+
+
+@pytest.mark.parametrize("sql", ["BEGIN", "BEGIN TRANSACTION;", "COMMIT", "rollback"])
+def test_run_query_rejects_standalone_transaction_control(sql):
+    result = asyncio.run(server.run_query(sql, 20))
+    assert result == {"success": False, "error": server._TRANSACTION_ERROR, "version": server.VERSION}
+
+
+@pytest.mark.parametrize("sql", ["ALTER SESSION SET TIMEZONE = 'UTC'", "CREATE TEMPORARY TABLE t (a INT)"])
+def test_run_query_rejects_standalone_session_state(sql):
+    result = asyncio.run(server.run_query(sql, 20))
+    assert result == {"success": False, "error": server._SESSION_STATE_ERROR, "version": server.VERSION}